@@ -0,0 +1,33 @@
+# _avg_kernel.py
+
+import numpy as np
+from numba import njit, prange
+
+
+# No fastmath here: it lets Numba assume there are no NaNs, which would drop the v == v null check
+@njit(parallel=True, cache=True)
+def col_sums_counts(columns):
+    """
+    NaN-skipping sum and value count of each column, one column per parallel task.
+    Callers streaming record batches add these up across batches and divide at the end.
+
+    Args:
+        columns (np.ndarray): Contiguous (n_columns, n_rows) float64 array, one row per column
+                              so each column's values are read sequentially. Nulls are NaN.
+
+    Returns:
+        tuple: (sums, counts) - float64 and int64 arrays of length n_columns.
+    """
+    sums = np.zeros(columns.shape[0])
+    counts = np.zeros(columns.shape[0], dtype=np.int64)
+    for j in prange(columns.shape[0]):
+        s = 0.0
+        n = 0
+        for i in range(columns.shape[1]):
+            v = columns[j, i]
+            if v == v: # False only for NaN
+                s += v
+                n += 1
+        sums[j] = s
+        counts[j] = n
+    return sums, counts
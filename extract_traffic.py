@@ -1,12 +1,23 @@
 # extract_traffic.py (with explicit unit labels)
 
 import os
+import math
+import asyncio
 import datetime
-import requests
-import pandas as pd
-import xml.etree.ElementTree as ET
+from email.utils import parsedate_to_datetime
+import functools
+import logging
+import httpx
+import numpy as np
+from numba import njit
+import pyarrow as pa
+import pyarrow.parquet as pq
+from lxml import etree as ET
 from dotenv import load_dotenv
-import traceback
+
+logger = logging.getLogger(__name__)
+# httpx logs every request URL at INFO, and the URL carries the API key as a query parameter
+logging.getLogger("httpx").setLevel(logging.WARNING)
 
 # --- Configuration ---
 load_dotenv()
@@ -23,11 +34,11 @@ CONFIG = {
     ],
 
     "api_timeout_seconds": 10,
+    "max_concurrent_requests": 16, # Upper bound on points fetched in parallel
     # --- MODIFIED: Read folder from environment variable TRAFFIC_OUTPUT_FOLDER ---
     "folder": os.getenv("TRAFFIC_OUTPUT_FOLDER", "traffic_data"), # Default to 'traffic_data' if env var not set
     # --- END MODIFIED ---
-    "extension": "parquet",
-    "file_name_timestamp_format": "%Y%m%d_%H%M%S"
+    "extension": "parquet" # File names carry a YYYYMMDD_HHMMSS timestamp (see construct_file_path)
 }
 
 # --- Initial Checks ---
@@ -36,39 +47,175 @@ if not CONFIG["TOMTOM_API_KEY"]:
 
 os.makedirs(CONFIG["folder"], exist_ok=True)
 
+# Constant per process; read once instead of per file name
+_OUTPUT_FOLDER = CONFIG["folder"]
+_FILE_EXTENSION_SUFFIX = f".{CONFIG['extension']}"
+# "10.79187,106.68831" -> "10_79187-106_68831" (file-name safe) in a single pass
+_ID_TRANS = str.maketrans({".": "_", ",": "-"})
+# Query parameters shared by every flowSegmentData request
+_BASE_PARAMS = {"key": CONFIG["TOMTOM_API_KEY"]}
+# Rows per Parquet row group; large groups give DuckDB big vectorized chunks to scan
+PARQUET_ROW_GROUP_SIZE = 64_000
+
+# --- HTTP Client ---
+# One HTTP/2 client per extraction run (see _new_client): concurrent requests are multiplexed
+# as streams over a single keep-alive TCP+TLS connection to api.tomtom.com,
+# so DNS resolution and the TLS handshake happen once rather than per point.
+
+# Rate-limit related response headers worth logging when the API pushes back
+_RATE_LIMIT_HEADERS = ("retry-after", "x-ratelimit-limit", "x-ratelimit-remaining", "x-ratelimit-reset")
+# The transport only retries failed connections; throttled (429) and transient 5xx responses
+# are retried by fetch_bytes_from_api_async, with exponential backoff or the server's Retry-After
+_RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+_MAX_STATUS_RETRIES = 3
+_RETRY_BACKOFF_SECONDS = 0.2 # Doubles on each retry
+_MAX_RETRY_AFTER_SECONDS = 60.0 # Upper bound on a server-requested wait
+
+
+def _new_client():
+    """
+    The HTTP/2 client used by extract_traffic_data_for_areas_async.
+    Created per run, since an AsyncClient is bound to the event loop it is used on.
+    """
+    return httpx.AsyncClient(
+        transport=httpx.AsyncHTTPTransport(
+            http2=True,
+            retries=3, # Retries failed connection attempts
+            limits=httpx.Limits(max_keepalive_connections=8),
+        ),
+        timeout=CONFIG["api_timeout_seconds"],
+    )
+
+# --- flowSegmentData XML Fields and Precompiled XPath Expressions ---
+# The flowSegmentData XML schema is fixed, so each scalar's Python type is known up front
+_SCALAR_TYPES = {
+    'frc': str,
+    'currentSpeed': float,        # km/h
+    'freeFlowSpeed': float,       # km/h
+    'currentTravelTime': int,     # seconds (per segment)
+    'freeFlowTravelTime': int,    # seconds (per segment)
+    'confidence': float,          # unitless
+    'roadClosure': lambda text: text.lower() == 'true',
+}
+SCALAR_TAGS = list(_SCALAR_TYPES)
+
+# One parser for every response, with the cheapest feature set: no ID collection, no blank
+# text nodes, no recovery, and no entity resolution (which also closes off XXE).
+# Points are parsed one at a time on the event loop thread, and parsing these payloads
+# is tiny next to the HTTP round-trip, so one shared parser is enough.
+_XML_PARSER = ET.XMLParser(collect_ids=False, remove_blank_text=True, huge_tree=False,
+                           recover=False, resolve_entities=False)
+
+# All scalar children of <flowSegmentData> in a single C-level pass
+_SCALAR_XPATH = ET.XPath("./*[" + " or ".join(f"self::{tag}" for tag in SCALAR_TAGS) + "]")
+# Latitude/longitude text nodes, restricted to coordinates that carry both values
+# so the two result lists always line up pairwise
+_COORDS_PREDICATE = "./coordinates/coordinate[latitude != '' and longitude != '']"
+_LAT_XPATH = ET.XPath(f"{_COORDS_PREDICATE}/latitude/text()")
+_LON_XPATH = ET.XPath(f"{_COORDS_PREDICATE}/longitude/text()")
+
+# --- Output Schema (one row per flow segment, raw TomTom API units) ---
+# Coordinates are stored as flat float32 buffers (LIST<STRUCT<lat, lon>>), which DuckDB
+# reads natively as STRUCT(lat FLOAT, lon FLOAT)[] without object conversion
+COORDINATE_TYPE = pa.struct([("lat", pa.float32()), ("lon", pa.float32())])
+# Numeric columns use the narrowest types that hold their real ranges (speeds <= ~300 km/h,
+# confidence in [0, 1], travel times in seconds), halving Parquet bytes and DuckDB scan bandwidth
+TRAFFIC_SCHEMA = pa.schema([
+    ("frc", pa.string()),                     # functional road class, e.g. "FRC2" (dictionary-encoded by Parquet)
+    ("currentSpeed", pa.float32()),           # km/h
+    ("freeFlowSpeed", pa.float32()),          # km/h
+    ("currentTravelTime", pa.int32()),        # seconds (per segment)
+    ("freeFlowTravelTime", pa.int32()),       # seconds (per segment)
+    ("confidence", pa.float32()),             # unitless
+    ("roadClosure", pa.bool_()),
+    ("coordinate_count", pa.int32()),         # unitless
+    ("coordinates", pa.list_(COORDINATE_TYPE)), # list of {lat, lon} (degrees)
+    ("segment_length_km", pa.float32()),      # km, along the segment polyline
+    # When the response was received (UTC). The run_date=... directory only partitions the files;
+    # this column keeps each row's run identifiable once loaded into the append-only DuckDB table
+    ("fetched_at", pa.timestamp("s", tz="UTC")),
+])
+
 # --- Helper Functions (Implemented) ---
 
-def construct_file_path(point_identifier):
+def construct_file_path(batch_identifier):
     """
-    Constructs the full file path for saving the data for a given point.
+    Constructs the full file path for saving one extraction batch.
+    Files form a hive-style dataset partitioned by run date:
+    <folder>/run_date=YYYY-MM-DD/traffic_data_<batch_identifier>_<timestamp>.parquet
     """
-    # point_identifier is a string like "lat,lon" (degrees)
-    timestamp = datetime.datetime.now().strftime(CONFIG["file_name_timestamp_format"])
-    safe_point_id = point_identifier.replace('.', '_').replace(',', '-')
-    file_name = f"traffic_data_{safe_point_id}_{timestamp}.{CONFIG['extension']}"
-    file_path = os.path.join(CONFIG["folder"], file_name)
+    # batch_identifier is a label such as "route", or a single "lat,lon" point (degrees)
+    now = datetime.datetime.now()
+    timestamp = f"{now.year:04d}{now.month:02d}{now.day:02d}_{now.hour:02d}{now.minute:02d}{now.second:02d}"
+    file_path = _file_path_prefix(batch_identifier, now.date()) + timestamp + _FILE_EXTENSION_SUFFIX
     return file_path
 
 
-def save_to_parquet(df, file_path):
+@functools.lru_cache(maxsize=256)
+def _file_path_prefix(batch_identifier, run_date):
+    """
+    Returns the constant part of a batch file path, up to the timestamp:
+    <folder>/run_date=YYYY-MM-DD/traffic_data_<safe batch identifier>_
+    """
+    safe_batch_id = batch_identifier.translate(_ID_TRANS)
+    return os.path.join(_OUTPUT_FOLDER, f"run_date={run_date.isoformat()}", f"traffic_data_{safe_batch_id}_")
+
+
+def write_tables_to_parquet(tables, file_path):
     """
-    Saves a pandas DataFrame to a Parquet file.
-    Input DataFrame columns have units as per TomTom API (km/h, seconds, etc.)
+    Streams an iterable of TRAFFIC_SCHEMA tables into one ZSTD-compressed Parquet file,
+    creating its partition directory if needed. One ParquetWriter stays open for the whole
+    batch, so the footer, metadata and compressor state are set up once rather than per record,
+    and incoming tables are buffered into row groups of PARQUET_ROW_GROUP_SIZE rows.
+    Input table columns have units as per TomTom API (km/h, seconds, etc.)
+
+    Returns:
+        int: Number of rows written (0 if there was nothing to write or writing failed).
     """
+    writer = None
+    buffered, buffered_rows, rows_written = [], 0, 0
+
+    def flush():
+        nonlocal writer, buffered, buffered_rows, rows_written
+        if writer is None:
+            logger.info("Saving data to %s", file_path)
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            writer = pq.ParquetWriter(file_path, TRAFFIC_SCHEMA, compression="zstd",
+                                      compression_level=3, use_dictionary=["frc"])
+        writer.write_table(pa.concat_tables(buffered), row_group_size=PARQUET_ROW_GROUP_SIZE)
+        rows_written += buffered_rows
+        buffered, buffered_rows = [], 0
+
     try:
-        print(f"💾 Saving data to {file_path}")
-        df.to_parquet(file_path, index=False)
-        print("✅ Data saved successfully.")
-    except ImportError:
-        print("❌ Error saving data: Parquet engine (like 'pyarrow' or 'fastparquet') not installed.")
-        print("Install one using: pip install pyarrow")
+        for table in tables:
+            buffered.append(table)
+            buffered_rows += table.num_rows
+            if buffered_rows >= PARQUET_ROW_GROUP_SIZE:
+                flush()
+        if buffered:
+            flush()
     except Exception as e:
-        print(f"❌ Error saving data to Parquet: {e}")
+        logger.error("Error saving data to Parquet: %s", e)
+        if writer is not None:
+            writer.close()
+            os.remove(file_path) # Don't leave a truncated file behind
+        return 0
+
+    if writer is not None:
+        writer.close()
+        logger.info("Saved %d row(s) successfully.", rows_written)
+    return rows_written
+
+
+@functools.lru_cache(maxsize=None)
+def _endpoint_url(zoom, format):
+    """Returns the flowSegmentData endpoint URL for a zoom/format pair (built once per pair)."""
+    return f"{CONFIG['TOMTOM_TRAFFIC_API_BASE_URL']}/{zoom}/{format}"
 
 
 def construct_api_url(point_lat_lon_str, zoom=10, format='xml', **kwargs):
     """
-    Constructs the TomTom Traffic API URL for /flowSegmentData/absolute endpoint.
+    Constructs the TomTom Traffic API request for /flowSegmentData/absolute endpoint.
 
     Args:
         point_lat_lon_str (str): Point coordinate string (lat,lon in degrees).
@@ -76,158 +223,278 @@ def construct_api_url(point_lat_lon_str, zoom=10, format='xml', **kwargs):
         format (str): Data format (string).
 
     Returns:
-        str: Constructed API URL including API key.
+        tuple: (endpoint URL (str), query parameters (dict) including API key).
+               The parameters are encoded by the HTTP client at request time.
     """
-    base = CONFIG["TOMTOM_TRAFFIC_API_BASE_URL"]
-    key = CONFIG["TOMTOM_API_KEY"]
-    url = f"{base}/{zoom}/{format}"
+    url = _endpoint_url(zoom, format)
+    params = {**_BASE_PARAMS, "point": point_lat_lon_str, **kwargs} # Point is lat,lon string
 
-    query_params = f"key={key}&point={point_lat_lon_str}" # Point is lat,lon string
-    for param, value in kwargs.items():
-        query_params += f"&{param}={value}"
+    logger.debug("Constructed URL: %s (point=%s)", url, point_lat_lon_str)
+    return url, params
 
-    url += f"?{query_params}"
-    print(f"Constructed URL: {url}")
-    return url
 
+def _retry_delay(response, attempt):
+    """
+    Seconds to wait before retrying a response, or None if it shouldn't be retried
+    (success, a non-transient status, or retries used up).
+    Honours a Retry-After header (seconds or HTTP date), else backs off exponentially.
+    """
+    if response.status_code not in _RETRY_STATUSES or attempt >= _MAX_STATUS_RETRIES:
+        return None
+    if response.status_code == 429:
+        rate_limit = {name: response.headers[name] for name in _RATE_LIMIT_HEADERS if name in response.headers}
+        logger.warning("Rate limited by the API: %s", rate_limit)
 
-def fetch_data_from_api(url):
+    retry_after = response.headers.get("retry-after")
+    delay = _RETRY_BACKOFF_SECONDS * 2 ** attempt
+    if retry_after:
+        try:
+            delay = float(retry_after)
+        except ValueError:
+            try:
+                retry_at = parsedate_to_datetime(retry_after)
+                if retry_at.tzinfo is None: # "-0000" dates parse as naive, but HTTP dates are always UTC
+                    retry_at = retry_at.replace(tzinfo=datetime.timezone.utc)
+                delay = (retry_at - datetime.datetime.now(retry_at.tzinfo)).total_seconds()
+            except (TypeError, ValueError):
+                pass # Unparseable header; keep the backoff delay
+    delay = min(max(delay, 0.0), _MAX_RETRY_AFTER_SECONDS)
+    logger.info("HTTP %s from the API; retrying in %.2f s (attempt %d of %d)",
+                response.status_code, delay, attempt + 1, _MAX_STATUS_RETRIES)
+    return delay
+
+
+async def fetch_bytes_from_api_async(client, semaphore, url, params=None):
     """
-    Fetches data from the given API URL. Returns raw response text (XML).
-    API timeout is in seconds (CONFIG['api_timeout_seconds']).
+    Fetches data from the given API URL with the given httpx.AsyncClient. Returns the raw
+    response body (XML bytes), left undecoded so the XML parser can honour the document's
+    own encoding declaration. API timeout is in seconds (CONFIG['api_timeout_seconds']).
+    Each request runs under the semaphore, which bounds concurrent requests. 429/5xx responses
+    are retried (see _retry_delay); the wait is an asyncio.sleep outside the semaphore, so other
+    points keep going (and keep the concurrency slots) while this one backs off.
     """
-    print(f"🌐 Fetching data from: {url} (Timeout: {CONFIG['api_timeout_seconds']} seconds)")
+    logger.debug("Fetching data from: %s (Timeout: %s seconds)", url, CONFIG['api_timeout_seconds'])
     try:
-        response = requests.get(url=url, timeout=CONFIG["api_timeout_seconds"])
+        attempt = 0
+        while True:
+            async with semaphore:
+                response = await client.get(url, params=params)
+            delay = _retry_delay(response, attempt)
+            if delay is None:
+                break
+            await asyncio.sleep(delay)
+            attempt += 1
         response.raise_for_status()
-        return response.text
+        return response.content
 
-    except requests.exceptions.RequestException as e:
-        print(f"❌ Failed to fetch data: {e}")
+    except httpx.HTTPError as e:
+        # httpx error messages include the request URL, and with it the API key
+        logger.error("Failed to fetch data: %s", str(e).replace(CONFIG["TOMTOM_API_KEY"], "<redacted>"))
         return None
 
 
+# --- Geometry Kernels ---
+
+EARTH_RADIUS_KM = 6371.0088 # Mean Earth radius (km)
+
+
+@njit(cache=True, fastmath=True)
+def segment_length_km(coords):
+    """
+    Length of the polyline through coords, in km: the sum of haversine distances
+    between consecutive points.
+
+    Args:
+        coords (np.ndarray): Contiguous (n, 2) float64 array of (latitude, longitude) in degrees.
+
+    Returns:
+        float: Polyline length in km (0.0 for fewer than two points).
+    """
+    total = 0.0
+    for i in range(1, coords.shape[0]):
+        lat1 = math.radians(coords[i - 1, 0])
+        lat2 = math.radians(coords[i, 0])
+        half_dlat = 0.5 * (lat2 - lat1)
+        half_dlon = 0.5 * math.radians(coords[i, 1] - coords[i - 1, 1])
+        a = math.sin(half_dlat) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(half_dlon) ** 2
+        total += 2.0 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+    return total
+
+
 # --- Data Parsing Function ---
 
-def parse_traffic_response_to_dataframe(xml_data):
+def _convert_scalar(tag, text):
     """
-    Parses the XML response from the TomTom Traffic API into a pandas DataFrame.
+    Converts one scalar's XML text to its Python type. An empty or malformed value
+    (e.g. a fractional travel time "120.5") becomes None, so one bad field nulls
+    just that field instead of discarding the whole record.
+    """
+    if not text:
+        return None
+    try:
+        return _SCALAR_TYPES[tag](text)
+    except ValueError:
+        logger.warning("Could not convert %s value %r; storing null.", tag, text)
+        return None
+
+
+def parse_traffic_response_to_table(xml_bytes, fetched_at=None):
+    """
+    Parses the raw XML response body (bytes) from the TomTom Traffic API into a one-row
+    pyarrow Table with TRAFFIC_SCHEMA. No pandas DataFrame is built on this path.
     Assigns raw API units to columns:
     - currentSpeed, freeFlowSpeed: km/h
     - currentTravelTime, freeFlowTravelTime: seconds (per segment)
     - confidence, frc, roadClosure, coordinate_count: unitless
-    - coordinates: list of (latitude, longitude) tuples (degrees)
+    - coordinates: list of {lat, lon} structs (degrees)
+    - segment_length_km: km (haversine length of the coordinate polyline)
+    - fetched_at: UTC timestamp of the response (fetched_at, or now if not given)
+
+    Returns:
+        pa.Table/None: Parsed table, or None if there was nothing to parse or parsing failed.
     """
-    if not xml_data:
-        print("No XML data provided for parsing.")
-        return pd.DataFrame()
+    if not xml_bytes:
+        logger.warning("No XML data provided for parsing.")
+        return None
 
-    records = []
     try:
-        root = ET.fromstring(xml_data)
-        segment_data = {}
+        root = ET.fromstring(xml_bytes, parser=_XML_PARSER)
+        segment_data = dict.fromkeys(SCALAR_TAGS)
+
+        for element in _SCALAR_XPATH(root):
+            segment_data[element.tag] = _convert_scalar(element.tag, element.text)
+
+        # Units: degrees
+        lats = np.fromiter(_LAT_XPATH(root), dtype=np.float64)
+        lons = np.fromiter(_LON_XPATH(root), dtype=np.float64)
+        coords = np.column_stack((lats, lons)) # (n, 2) float64 array of (lat, lon) (degrees)
+
+        segment_data['coordinate_count'] = coords.shape[0] # Unitless
+        segment_data['segment_length_km'] = segment_length_km(coords) # km (computed at float64 precision)
+        # Whole seconds, matching the column's timestamp[s] type
+        segment_data['fetched_at'] = (fetched_at or datetime.datetime.now(datetime.timezone.utc)).replace(microsecond=0)
+
+        # Values are already typed, so the schema is applied directly with no coercion pass
+        columns = {col: [value] for col, value in segment_data.items()}
+        # One list entry holding all of this segment's points, built from the numpy buffers
+        columns['coordinates'] = pa.ListArray.from_arrays(
+            offsets=pa.array([0, coords.shape[0]], type=pa.int32()),
+            values=pa.StructArray.from_arrays(
+                [pa.array(lats.astype(np.float32)), pa.array(lons.astype(np.float32))],
+                fields=list(COORDINATE_TYPE),
+            ),
+        )
+        table = pa.Table.from_pydict(columns, schema=TRAFFIC_SCHEMA)
+        logger.debug("Created table with %d rows and %d columns after parsing.", table.num_rows, table.num_columns)
+        logger.debug("Table column units: currentSpeed, freeFlowSpeed (km/h); currentTravelTime, freeFlowTravelTime (seconds per segment).")
+
+        logger.debug("Successfully parsed data for %d record(s).", table.num_rows)
+        return table
 
-        scalar_tags = ['frc', 'currentSpeed', 'freeFlowSpeed', 'currentTravelTime',
-                       'freeFlowTravelTime', 'confidence', 'roadClosure']
+    except ET.ParseError as e:
+        logger.exception("Error parsing XML response: %s", e)
+        return None
+    except Exception as e:
+        logger.exception("Error processing parsed XML data: %s", e)
+        return None
 
-        for tag in scalar_tags:
-            element = root.find(tag)
-            segment_data[tag] = element.text if element is not None else None
 
-        coordinates_list = []
-        coords_element = root.find('coordinates')
-        if coords_element is not None:
-            for coord_elem in coords_element.findall('coordinate'):
-                lat_elem = coord_elem.find('latitude')
-                lon_elem = coord_elem.find('longitude')
-                # Units: degrees
-                lat = float(lat_elem.text) if lat_elem is not None and lat_elem.text else None
-                lon = float(lon_elem.text) if lon_elem is not None and lon_elem.text else None
-                if lat is not None and lon is not None:
-                    coordinates_list.append((lat, lon)) # Store as (lat, lon) tuples (degrees)
+# --- Main ETL Extraction Function ---
 
-        segment_data['coordinate_count'] = len(coordinates_list) # Unitless
-        segment_data['coordinates'] = coordinates_list # List of (degree, degree) tuples
+async def _process_point(client, semaphore, point_identifier):
+    """
+    Runs construct URL -> fetch -> parse for a single point. Each HTTP request of the fetch
+    runs under the semaphore, so at most CONFIG['max_concurrent_requests'] are in flight at once.
 
-        records.append(segment_data)
+    Args:
+        client (httpx.AsyncClient): Shared client for the run.
+        semaphore (asyncio.Semaphore): Bounds concurrent requests.
+        point_identifier (str): Geographic point string (lat,lon in degrees).
 
-        df = pd.DataFrame(records)
-        print(f"Created DataFrame with {df.shape[0]} rows and {df.shape[1]} columns after parsing.")
-        print(f"DataFrame column units: currentSpeed, freeFlowSpeed (km/h); currentTravelTime, freeFlowTravelTime (seconds per segment).")
+    Returns:
+        pa.Table/None: Parsed single-row table, or None if fetching/parsing failed.
+    """
+    try:
+        api_url, api_params = construct_api_url(point_lat_lon_str=point_identifier, zoom=10, format='xml')
+        logger.info("Processing point: %s (lat, lon in degrees)", point_identifier)
 
+        xml_bytes = await fetch_bytes_from_api_async(client, semaphore, api_url, api_params)
+        fetched_at = datetime.datetime.now(datetime.timezone.utc)
 
-        numeric_cols = ['currentSpeed', 'freeFlowSpeed', 'currentTravelTime', 'freeFlowTravelTime', 'confidence']
-        for col in numeric_cols:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
+        if not xml_bytes:
+            logger.warning("Failed to fetch data for point: %s.", point_identifier)
+            return None
 
-        if 'roadClosure' in df.columns:
-            df['roadClosure'] = df['roadClosure'].astype(str).str.lower() == 'true'
+        table = parse_traffic_response_to_table(xml_bytes, fetched_at)
 
-        print(f"Successfully parsed data for {len(df)} record(s).")
-        return df
+        if table is None or table.num_rows == 0:
+            logger.warning("No data or failed to parse data for point: %s.", point_identifier)
+            return None
 
-    except ET.ParseError as e:
-        print(f"❌ Error parsing XML response: {e}")
-        traceback.print_exc()
-        return pd.DataFrame()
-    except Exception as e:
-        print(f"❌ Error processing parsed XML data: {e}")
-        traceback.print_exc()
-        return pd.DataFrame()
+        return table
 
+    except Exception as e:
+        logger.exception("An unexpected error occurred while processing point %s: %s", point_identifier, e)
+        return None
 
-# --- Main ETL Extraction Function ---
 
-def extract_traffic_data_for_areas(points_to_process):
+def extract_traffic_data_for_areas(points_to_process, batch_identifier="route"):
     """
-    Iteratively extracts traffic data for a list of defined geographic points.
-    Saves successfully extracted data to Parquet files.
+    Extracts traffic data for a list of defined geographic points.
+    Synchronous entry point: runs extract_traffic_data_for_areas_async on a new event loop
+    (so it can't be called from inside a running loop - await the async version there).
 
     Args:
         points_to_process (list): List of geographic point strings (lat,lon in degrees).
+        batch_identifier (str): Label used in the batch file name.
 
     Returns:
-        list: List of file paths (strings) for all successfully extracted and saved data files.
+        list: List of file paths (strings) for all successfully extracted and saved data files
+              (one per batch; empty if nothing was extracted).
     """
-    file_paths = []
+    return asyncio.run(extract_traffic_data_for_areas_async(points_to_process, batch_identifier))
 
-    if not points_to_process:
-        print("No points specified for extraction.")
-        return file_paths
 
-    print(f"--- Starting ETL Extraction for {len(points_to_process)} point(s) ---")
+async def extract_traffic_data_for_areas_async(points_to_process, batch_identifier="route"):
+    """
+    Extracts traffic data for a list of defined geographic points. All points are fetched
+    concurrently on one event loop over an HTTP/2 AsyncClient, with in-flight requests capped
+    by an asyncio.Semaphore(CONFIG['max_concurrent_requests']). All successfully parsed points
+    are written together as a single Parquet file for the batch (see construct_file_path),
+    rather than one tiny file per point.
 
-    for point_identifier in points_to_process: # point_identifier is string "lat,lon" (degrees)
-        try:
-            api_url = construct_api_url(point_lat_lon_str=point_identifier, zoom=10, format='xml')
-            print(f"\nProcessing point: {point_identifier} (lat, lon in degrees)")
+    Args:
+        points_to_process (list): List of geographic point strings (lat,lon in degrees).
+        batch_identifier (str): Label used in the batch file name.
 
-            xml_data = fetch_data_from_api(api_url)
+    Returns:
+        list: File paths (strings) of the saved data files (one per batch; empty if nothing was extracted).
+    """
+    if not points_to_process:
+        logger.warning("No points specified for extraction.")
+        return []
 
-            if xml_data:
-                df = parse_traffic_response_to_dataframe(xml_data)
+    logger.info("Starting ETL Extraction for %d point(s)", len(points_to_process))
 
-                if not df.empty:
-                    file_path = construct_file_path(point_identifier) # point_identifier is string "lat,lon"
-                    save_to_parquet(df, file_path)
-                    file_paths.append(file_path)
-                else:
-                    print(f"No data or failed to parse data for point: {point_identifier}.")
-            else:
-                print(f"Failed to fetch data for point: {point_identifier}.")
+    semaphore = asyncio.Semaphore(CONFIG["max_concurrent_requests"])
+    async with _new_client() as client:
+        tables = await asyncio.gather(
+            *(_process_point(client, semaphore, point) for point in points_to_process)
+        )
 
-        except Exception as e:
-            print(f"❌ An unexpected error occurred while processing point {point_identifier}: {e}")
-            traceback.print_exc()
-            continue
+    file_path = construct_file_path(batch_identifier)
+    rows_written = write_tables_to_parquet((table for table in tables if table is not None), file_path)
 
-    print("\n✅ ETL Extraction phase completed.")
-    return file_paths
+    logger.info("ETL Extraction phase completed.")
+    if not rows_written:
+        logger.warning("No rows written for this batch.")
+        return []
+    return [file_path]
 
 
 # --- Main Execution Block ---
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
     print("Running extracts.py directly...")
 
     # --- Part 1: Extraction ---
@@ -235,3 +502,7 @@ if __name__ == "__main__":
     # ... code to call extract_traffic_data_for_areas ...
     extracted_file_paths = extract_traffic_data_for_areas(CONFIG['ROUTE_POINTS_EXAMPLE']) # <-- This creates the files
 
+    # --- Part 2: Inspect the output (pandas is only used here, for interactive debugging) ---
+    for file_path in extracted_file_paths:
+        print(f"\nContents of {file_path}:")
+        print(pq.read_table(file_path).to_pandas().head())
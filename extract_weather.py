@@ -2,11 +2,23 @@
 
 import os
 import datetime
+import functools
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import pandas as pd
 import json # Weather APIs commonly return JSON
+try:
+    # orjson parses the raw response bytes ~2-5x faster than stdlib json on small payloads.
+    # Its JSONDecodeError subclasses json.JSONDecodeError, so error handling is unchanged.
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+from urllib.parse import urlencode
 from dotenv import load_dotenv # Keep for standalone testing, but Airflow handles env vars
-import traceback
+import logging
+
+logger = logging.getLogger(__name__)
 
 # --- Configuration ---
 # In an Airflow environment, it's best to rely on Airflow Variables or Connection
@@ -28,6 +40,15 @@ FILE_EXTENSION = "parquet"
 FILE_NAME_TIMESTAMP_FORMAT = "%Y%m%d_%H%M%S"
 API_TIMEOUT_SECONDS = int(os.getenv("WEATHER_API_TIMEOUT_SECONDS", 10)) # Default timeout
 
+# Shared keep-alive session: repeated calls to the weather API reuse pooled
+# connections instead of paying a new TCP+TLS handshake per location.
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=16,
+    max_retries=Retry(total=3, backoff_factor=0.2, status_forcelist=[429, 500, 502, 503, 504]),
+))
+
 
 # --- Initial Checks ---
 # Perform checks within the main task function, not at the top level,
@@ -67,62 +88,62 @@ def construct_weather_api_url(location_coords: dict, api_key: str, base_url: str
     }
 
     # Construct the full URL with parameters
-    # requests.Request handles URL encoding of parameters
-    req = requests.Request('GET', base_url, params=params)
-    prepared_url = req.prepare().url
+    # urlencode handles URL encoding of the (scalar) parameters; building a
+    # requests.PreparedRequest just to format a query string is unnecessary
+    url = f"{base_url}?{urlencode(params)}"
 
-    print(f"Constructed Weather API URL: {prepared_url}")
-    return prepared_url
+    logger.debug("Constructed Weather API URL: %s", url)
+    return url
 
 
-def fetch_data_from_api(url: str, timeout: int) -> str or None:
+def fetch_bytes_from_api(url: str, timeout: int) -> bytes or None:
     """
-    Fetches data from the given API URL. Returns raw response text (JSON).
+    Fetches data from the given API URL. Returns the raw response body (JSON bytes).
+    The body is not decoded to text here; the JSON parser reads UTF-8 bytes directly.
 
     Args:
         url (str): API URL to fetch data from.
         timeout (int): Request timeout in seconds.
 
     Returns:
-        str: Raw response text (JSON), or None if request fails.
+        bytes: Raw response body (JSON), or None if request fails.
     """
-    print(f"🌐 Fetching data from: {url} (Timeout: {timeout} seconds)")
+    logger.debug("Fetching data from: %s (Timeout: %s seconds)", url, timeout)
     try:
-        response = requests.get(url=url, timeout=timeout)
+        response = _SESSION.get(url, timeout=timeout)
         response.raise_for_status() # Raise an HTTPError for bad responses (4xx or 5xx)
 
         # Weather APIs usually return JSON
-        return response.text
+        return response.content
 
     except requests.exceptions.RequestException as e:
-        print(f"❌ Failed to fetch data: {e}")
-        traceback.print_exc()
+        logger.exception("Failed to fetch data: %s", e)
         return None
 
 
-def parse_weather_response_to_dataframe(json_data: str, location_coords: dict) -> pd.DataFrame:
+def parse_weather_response_to_dataframe(json_bytes: bytes, location_coords: dict) -> pd.DataFrame:
     """
     Parses the JSON response from the Weather API into a pandas DataFrame.
     Adds location coordinates and fetch timestamp.
     <<< YOU NEED TO ADAPT THIS FUNCTION FOR YOUR SPECIFIC WEATHER API RESPONSE STRUCTURE >>>
 
     Args:
-        json_data (str): Raw JSON response text.
+        json_bytes (bytes): Raw JSON response body.
         location_coords (dict): The coordinates used for the location (for adding to DataFrame).
 
     Returns:
         pd.DataFrame: DataFrame containing parsed weather data, or empty DataFrame on failure/no data.
     """
-    print("--- Inside parse_weather_response_to_dataframe ---")
+    logger.debug("Inside parse_weather_response_to_dataframe")
 
-    if not json_data:
-        print("No JSON data provided for parsing.")
+    if not json_bytes:
+        logger.warning("No JSON data provided for parsing.")
         return pd.DataFrame()
 
     try:
-        data = json.loads(json_data)
-        print("JSON loaded successfully.")
-        # print("Raw JSON data structure (first 500 chars):", json_data[:500] + ('...' if len(json_data) > 500 else '')) # Optional debug print
+        data = json_loads(json_bytes)
+        logger.debug("JSON loaded successfully.")
+        # logger.debug("Raw JSON data structure (first 500 chars): %s", json_bytes[:500]) # Optional debug log
 
         # <<< ADAPT THIS SECTION BASED ON YOUR WEATHER API'S JSON STRUCTURE >>>
         # This is a hypothetical example structure based on common weather APIs (like OpenWeatherMap)
@@ -154,33 +175,32 @@ def parse_weather_response_to_dataframe(json_data: str, location_coords: dict) -
         df = pd.DataFrame(records)
 
         # --- Optional: Convert data types ---
-        # Ensure numeric columns are actually numeric
-        numeric_cols = [
-            'latitude', 'longitude', 'temperature_celsius', 'feels_like_celsius',
+        # Ensure numeric columns are actually numeric, in one vectorized call per column group.
+        # Measurements are downcast to float32; coordinates stay float64 (float32 rounds to ~1 m).
+        coordinate_cols = ['latitude', 'longitude']
+        measurement_cols = [
+            'temperature_celsius', 'feels_like_celsius',
             'pressure_hpa', 'humidity_percent', 'wind_speed_mps', 'wind_deg',
             'cloudiness_percent'
         ]
-        for col in numeric_cols:
-            if col in df.columns:
-                 df[col] = pd.to_numeric(df[col], errors='coerce')
+        df[coordinate_cols] = df[coordinate_cols].apply(pd.to_numeric, errors='coerce')
+        df[measurement_cols] = df[measurement_cols].apply(pd.to_numeric, errors='coerce', downcast='float')
 
         # Convert timestamp to datetime objects if needed later, or keep as string for staging
         # df['timestamp_utc'] = pd.to_datetime(df['timestamp_utc'], errors='coerce')
 
 
-        print(f"Successfully parsed {len(df)} record(s) into DataFrame.")
-        # print(df.head()) # Optional: Print head for debugging
+        logger.debug("Successfully parsed %d record(s) into DataFrame.", len(df))
+        # logger.debug("%s", df.head()) # Optional: log head for debugging
 
-        print("--- Exiting parse_weather_response_to_dataframe ---")
+        logger.debug("Exiting parse_weather_response_to_dataframe")
         return df
 
     except json.JSONDecodeError as e:
-        print(f"❌ Error decoding JSON response: {e}")
-        traceback.print_exc()
+        logger.exception("Error decoding JSON response: %s", e)
         return pd.DataFrame()
     except Exception as e:
-        print(f"❌ Error processing parsed weather data: {e}")
-        traceback.print_exc()
+        logger.exception("Error processing parsed weather data: %s", e)
         return pd.DataFrame()
 
 
@@ -197,15 +217,23 @@ def construct_weather_file_path(location_coords: dict, output_folder: str, exten
     """
     # Use a timestamp to make filenames unique per extraction run
     timestamp = datetime.datetime.now().strftime(timestamp_format)
-    # Sanitize coordinates for use in a filename
-    lat = location_coords.get('lat', 'unknown').replace('.', '_').replace('-', 'minus')
-    lon = location_coords.get('lon', 'unknown').replace('.', '_').replace('-', 'minus')
-
-    file_name = f"weather_data_lat{lat}_lon{lon}_{timestamp}.{extension}"
-    file_path = os.path.join(output_folder, file_name)
+    prefix = _weather_file_prefix(output_folder, location_coords.get('lat', 'unknown'), location_coords.get('lon', 'unknown'))
+    file_path = f"{prefix}{timestamp}.{extension}"
     return file_path
 
 
+@functools.lru_cache(maxsize=256)
+def _weather_file_prefix(output_folder: str, lat, lon) -> str:
+    """
+    Returns the constant part of a weather file path for one location, up to the timestamp:
+    <output_folder>/weather_data_lat<lat>_lon<lon>_
+    """
+    # Sanitize coordinates for use in a filename (coordinates may be given as numbers or strings)
+    safe_lat = str(lat).replace('.', '_').replace('-', 'minus')
+    safe_lon = str(lon).replace('.', '_').replace('-', 'minus')
+    return os.path.join(output_folder, f"weather_data_lat{safe_lat}_lon{safe_lon}_")
+
+
 def save_weather_to_parquet(df: pd.DataFrame, file_path: str):
     """
     Saves a pandas DataFrame to a Parquet file.
@@ -214,17 +242,16 @@ def save_weather_to_parquet(df: pd.DataFrame, file_path: str):
         file_path: The path where the Parquet file should be saved.
     """
     try:
-        print(f"💾 Saving weather data to {file_path}")
+        logger.info("Saving weather data to %s", file_path)
         df.to_parquet(file_path, index=False)
-        print("✅ Weather data saved successfully.")
+        logger.info("Weather data saved successfully.")
     except ImportError:
-        print("❌ Error saving data: Parquet engine (like 'pyarrow' or 'fastparquet') not installed.")
-        print("Install one using: pip install pyarrow")
+        logger.error("Error saving data: Parquet engine (like 'pyarrow' or 'fastparquet') not installed. "
+                     "Install one using: pip install pyarrow")
         # In a real DAG, you might want to raise an exception here
         raise # Re-raise the exception to fail the task
     except Exception as e:
-        print(f"❌ Error saving weather data to Parquet: {e}")
-        traceback.print_exc()
+        logger.exception("Error saving weather data to Parquet: %s", e)
         # In a real DAG, you might want to raise an exception here
         raise # Re-raise the exception to fail the task
 
@@ -249,19 +276,19 @@ def extract_weather_data(location_coords: dict) -> str or None:
     location_name = location_coords.get("name", f"lat{lat}_lon{lon}") # Use name if available
 
     if lat is None or lon is None:
-        print(f"Invalid location coordinates provided: {location_coords}. Skipping extraction.")
+        logger.warning("Invalid location coordinates provided: %s. Skipping extraction.", location_coords)
         return None
 
-    print(f"--- Starting Weather Extraction for location: {location_name} ({lat},{lon}) ---")
+    logger.info("Starting Weather Extraction for location: %s (%s,%s)", location_name, lat, lon)
 
     if not WEATHER_API_KEY:
-        print("❌ WEATHER_API_KEY is not set as an environment variable. Cannot perform weather extraction.")
+        logger.error("WEATHER_API_KEY is not set as an environment variable. Cannot perform weather extraction.")
         # In Airflow, this likely means the Variable wasn't set or passed correctly.
         return None
 
     # Ensure output folder exists when the task runs
     os.makedirs(OUTPUT_FOLDER, exist_ok=True)
-    print(f"Weather data output folder '{OUTPUT_FOLDER}' ensured.")
+    logger.debug("Weather data output folder '%s' ensured.", OUTPUT_FOLDER)
 
 
     try:
@@ -273,12 +300,12 @@ def extract_weather_data(location_coords: dict) -> str or None:
             # Add any other necessary API parameters here
         )
 
-        # Fetch data from the API (returns JSON text)
-        json_data = fetch_data_from_api(api_url, API_TIMEOUT_SECONDS)
+        # Fetch data from the API (returns JSON bytes)
+        json_bytes = fetch_bytes_from_api(api_url, API_TIMEOUT_SECONDS)
 
-        if json_data: # Check if fetching was successful and returned text
+        if json_bytes: # Check if fetching was successful and returned a body
             # Parse the JSON response into a DataFrame
-            df = parse_weather_response_to_dataframe(json_data, location_coords)
+            df = parse_weather_response_to_dataframe(json_bytes, location_coords)
 
             if not df.empty:
                 # Construct file path based on location and timestamp
@@ -291,24 +318,23 @@ def extract_weather_data(location_coords: dict) -> str or None:
                 # Save the DataFrame to a Parquet file
                 save_weather_to_parquet(df, file_path)
 
-                print(f"✅ Extraction and saving successful for location: {location_name}. File: {file_path}")
+                logger.info("Extraction and saving successful for location: %s. File: %s", location_name, file_path)
                 return file_path # Return the file path for XCom
 
             else:
                 # This happens if fetch was successful but parsing returned an empty DataFrame
-                print(f"No data or failed to parse data for location: {location_name}. Check parse_weather_response_to_dataframe.")
+                logger.warning("No data or failed to parse data for location: %s. Check parse_weather_response_to_dataframe.", location_name)
                 return None # Return None if no data/parsing failed
 
         else:
-             # This happens if fetch_data_from_api returned None due to a request error
-             print(f"Failed to fetch data for location: {location_name}. See error message above.")
+             # This happens if fetch_bytes_from_api returned None due to a request error
+             logger.warning("Failed to fetch data for location: %s. See error message above.", location_name)
              return None # Return None if fetching failed
 
 
     except Exception as e:
         # Catch any unexpected errors during the processing of a single location
-        print(f"❌ An unexpected error occurred during extraction for location {location_name}: {e}")
-        traceback.print_exc()
+        logger.exception("An unexpected error occurred during extraction for location %s: %s", location_name, e)
         # In Airflow, raising an exception here will cause the task to fail.
         # If you return None, the task will succeed but indicate no file was generated.
         # Raising is generally preferred for actual errors.
@@ -318,6 +344,7 @@ def extract_weather_data(location_coords: dict) -> str or None:
 # --- Simple Test Function (For running this file directly) ---
 # This block runs ONLY when you execute 'python scripts/extract_weather.py' directly.
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
     print("Running scripts/extract_weather.py directly for testing...")
     print("Note: This requires WEATHER_API_KEY and WEATHER_API_BASE_URL set as environment variables.")
 
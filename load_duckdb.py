@@ -1,33 +1,154 @@
 # load_duckdb.py
 
+import atexit
+import datetime
+import functools
 import duckdb
 import pandas as pd
+import pyarrow as pa
 import os
 
-def load_transformed_data_to_duckdb(df: pd.DataFrame, db_path: str = 'traffic_data.duckdb', table_name: str = 'traffic_data'):
+# DuckDB settings applied once, when a database file is first opened
+DUCKDB_THREADS = 8
+DUCKDB_MEMORY_LIMIT = '4GB'
+
+# Every connection handed out by _get_con, so they can all be closed at interpreter exit
+_open_connections = []
+
+
+@functools.lru_cache(maxsize=8)
+def _get_con(db_path: str) -> duckdb.DuckDBPyConnection:
     """
-    Loads a pandas DataFrame into a DuckDB database table.
+    Returns a long-lived read-write connection to db_path, opening and configuring it on first use.
+    Reusing the connection across loads skips repeated WAL recovery and catalog loading,
+    and keeps DuckDB's buffer pool and object cache warm between loads.
+    """
+    con = duckdb.connect(database=db_path, read_only=False)
+    con.execute(f"PRAGMA threads={DUCKDB_THREADS}")
+    con.execute(f"PRAGMA memory_limit='{DUCKDB_MEMORY_LIMIT}'")
+    con.execute("PRAGMA enable_object_cache")
+    _open_connections.append(con)
+    print(f"Connected to DuckDB database: {db_path}")
+    return con
+
+
+def _close_connections():
+    """Closes every cached DuckDB connection (registered with atexit)."""
+    for con in _open_connections:
+        con.close()
+    _open_connections.clear()
+    _get_con.cache_clear()
+
+
+atexit.register(_close_connections)
+
+
+def _sql_string_literal(value: str) -> str:
+    """Quotes a Python string as a SQL string literal (single quotes doubled)."""
+    return "'" + value.replace("'", "''") + "'"
+
+
+# Errors from an INSERT ... BY NAME whose source columns can't be cast to the table's types
+_SCHEMA_MISMATCH_ERRORS = (duckdb.BinderException, duckdb.ConversionException, duckdb.TypeMismatchException)
+
+
+def _table_exists(con, table_name: str) -> bool:
+    """Whether a persistent (non-temporary) table with this name exists."""
+    return con.execute(
+        "SELECT count(*) FROM duckdb_tables() WHERE table_name = ? AND NOT temporary", [table_name]
+    ).fetchone()[0] > 0
+
+
+def _run_in_transaction(con, statements):
+    """
+    Runs each SQL statement in one transaction and returns the last one's fetched row,
+    rolling back (and re-raising) if any of them fails.
+    """
+    con.begin()
+    try:
+        for sql in statements:
+            row = con.execute(sql).fetchone()
+        con.commit()
+    except BaseException:
+        con.rollback()
+        raise
+    return row
+
+
+def _append_to_table(con, table_name: str, source: str) -> int:
+    """
+    Appends every row of source (a table, view or table function) to table_name in one
+    INSERT ... BY NAME, so columns are matched by name rather than position and DuckDB
+    casts compatible types (e.g. float64 into a FLOAT column) implicitly.
+
+    The table is created from source's schema on first load. Columns source has but the table
+    lacks are added with ALTER TABLE ADD COLUMN (earlier rows read them as NULL). Only if the
+    insert itself then can't cast source's columns (e.g. coordinates written as nested lists
+    before the extractor switched to {lat, lon} structs) is the table renamed to a unique
+    <table_name>_legacy_<timestamp>, keeping its rows, and recreated with the current schema.
+    Each attempt runs in its own transaction, so callers must not have one open.
+
+    Returns:
+        int: The number of rows inserted.
+    """
+    insert_sql = f"INSERT INTO {table_name} BY NAME SELECT * FROM {source};"
+    create_sql = f"CREATE TABLE {table_name} AS SELECT * FROM {source} WHERE 1=0;"
+    if not _table_exists(con, table_name):
+        return _run_in_transaction(con, [create_sql, insert_sql])[0]
+
+    incoming = con.execute(f"DESCRIBE SELECT * FROM {source}").fetchall()
+    existing = {row[0] for row in con.execute(f"DESCRIBE {table_name}").fetchall()}
+    add_columns = [
+        f'ALTER TABLE {table_name} ADD COLUMN "{col}" {col_type};'
+        for col, col_type, *_ in incoming if col not in existing
+    ]
+    try:
+        return _run_in_transaction(con, add_columns + [insert_sql])[0]
+    except _SCHEMA_MISMATCH_ERRORS as e:
+        legacy_name = f"{table_name}_legacy_{datetime.datetime.now():%Y%m%d_%H%M%S_%f}"
+        suffix = 1
+        while _table_exists(con, legacy_name):
+            legacy_name = f"{legacy_name}_{suffix}"
+            suffix += 1
+        print(f"⚠️ Table '{table_name}' can't take the new rows ({e}); renaming it to '{legacy_name}' and recreating it.")
+        return _run_in_transaction(
+            con, [f"ALTER TABLE {table_name} RENAME TO {legacy_name};", create_sql, insert_sql]
+        )[0]
+
+
+def load_transformed_data_to_duckdb(df, db_path: str = 'traffic_data.duckdb', table_name: str = 'traffic_data'):
+    """
+    Appends a pandas DataFrame or Arrow table to a DuckDB database table, creating the table on first load.
+    The data is registered with DuckDB as Arrow (which it scans zero-copy) and loaded with a single
+    bulk INSERT ... SELECT, never row by row; previously loaded rows are kept.
 
     Args:
-        df (pd.DataFrame): The DataFrame containing the data to load.
+        df (pd.DataFrame | pa.Table): The data to load. An Arrow table is registered as-is,
+                                      skipping the pandas -> Arrow conversion.
         db_path (str): The path to the DuckDB database file. Defaults to 'traffic_data.duckdb'.
         table_name (str): The name of the table to load the data into. Defaults to 'traffic_data'.
     """
     print(f"\n--- Starting Load Phase (DuckDB) ---")
 
-    if df.empty:
+    row_total = df.num_rows if isinstance(df, pa.Table) else len(df)
+    if row_total == 0:
         print("No data to load into DuckDB. Skipping load phase.")
         return
 
     try:
-        # Connect to DuckDB - creates the database file if it doesn't exist
-        con = duckdb.connect(database=db_path, read_only=False)
-        print(f"Connected to DuckDB database: {db_path}")
+        # Cached connection - creates the database file if it doesn't exist
+        con = _get_con(db_path)
+
+        # At most one pandas -> Arrow conversion; DuckDB reads the registered table without copying
+        arrow_table = df if isinstance(df, pa.Table) else pa.Table.from_pandas(df, preserve_index=False)
+        con.register("df_arrow", arrow_table)
 
-        # Create or Replace a persistent table
+        # Create the persistent table from the incoming schema on first load, then append
+        # every row in one set-based INSERT (DuckDB streams the Arrow scan in vectors itself)
         print(f"Loading data into table: {table_name}")
-        con.execute(f"CREATE OR REPLACE TABLE {table_name} AS SELECT * FROM df;")
-        print(f"Successfully loaded {len(df)} rows into table '{table_name}' in {db_path}")
+        _append_to_table(con, table_name, "df_arrow")
+        con.unregister("df_arrow")
+        print(f"Successfully appended {row_total} rows to table '{table_name}' in {db_path}")
 
         # Example: Verify data by querying
         # print(f"Querying sample data from {table_name}:")
@@ -36,14 +157,99 @@ def load_transformed_data_to_duckdb(df: pd.DataFrame, db_path: str = 'traffic_da
 
     except Exception as e:
         print(f"❌ Error loading data to DuckDB: {e}")
-    finally:
-        # Close the connection
-        if 'con' in locals() and con:
-            con.close()
-            print("DuckDB connection closed.")
 
     print(f"--- Load Phase (DuckDB) Complete ---")
 
+
+def _read_parquet_source(pattern):
+    """
+    Builds the read_parquet(...) table function for a path/glob string or a list of paths.
+    Returns None for an empty list.
+    """
+    if isinstance(pattern, str):
+        files = _sql_string_literal(pattern)
+    else:
+        if not pattern:
+            return None
+        files = "[" + ", ".join(_sql_string_literal(path) for path in pattern) + "]"
+    # Each row carries its own fetched_at timestamp, so the run_date=... directory names
+    # (which only partition the files) are kept out of the scanned columns
+    return f"read_parquet({files}, hive_partitioning = false)"
+
+
+def _describe_pattern(pattern):
+    """Short label for a path/glob string or a list of paths, for progress messages."""
+    return pattern if isinstance(pattern, str) else f"{len(pattern)} file(s)"
+
+
+def load_parquet_glob_to_duckdb(pattern, db_path: str = 'traffic_data.duckdb', table_name: str = 'traffic_data'):
+    """
+    Appends Parquet files straight into a DuckDB database table, creating the table on first load.
+    DuckDB scans the files with its own vectorized Parquet reader, so no pandas DataFrame
+    (or Python-side Arrow table) is materialized along the way.
+
+    Args:
+        pattern (str | list): File path or glob of the Parquet files to load,
+                              e.g. 'traffic_data/run_date=*/*.parquet', or a list of file paths.
+        db_path (str): The path to the DuckDB database file. Defaults to 'traffic_data.duckdb'.
+        table_name (str): The name of the table to load the data into. Defaults to 'traffic_data'.
+
+    Returns:
+        int/None: The number of rows appended (committed), or None if there were no files or the load failed.
+    """
+    print("\n--- Starting Load Phase (DuckDB, Parquet scan) ---")
+
+    source = _read_parquet_source(pattern)
+    if source is None:
+        print("No files to load into DuckDB. Skipping load phase.")
+        return None
+
+    row_count = None
+    try:
+        # Cached connection - creates the database file if it doesn't exist
+        con = _get_con(db_path)
+
+        print(f"Loading {_describe_pattern(pattern)} into table: {table_name}")
+        row_count = _append_to_table(con, table_name, source)
+        print(f"Successfully appended {row_count} rows to table '{table_name}' in {db_path}")
+
+    except Exception as e:
+        print(f"❌ Error loading Parquet data to DuckDB (nothing was loaded): {e}")
+
+    print("--- Load Phase (DuckDB, Parquet scan) Complete ---")
+    return row_count
+
+
+def load_parquet_with_averages_to_duckdb(pattern, average_columns, db_path: str = 'traffic_data.duckdb', table_name: str = 'traffic_data'):
+    """
+    Appends Parquet files to a DuckDB database table with load_parquet_glob_to_duckdb, then
+    returns the averages of the loaded rows, computed by DuckDB in SQL over the same files
+    (reading only the averaged columns); Python never sees the rows.
+
+    Averages are only computed once the append has committed, so callers never report
+    averages for data that wasn't stored.
+
+    Args:
+        pattern (str | list): File path or glob of the Parquet files to load, or a list of file paths.
+        average_columns (list): Numeric columns to average.
+        db_path (str): The path to the DuckDB database file. Defaults to 'traffic_data.duckdb'.
+        table_name (str): The name of the table to load the data into. Defaults to 'traffic_data'.
+
+    Returns:
+        dict: Column name -> average (None if the column has no values), or {} if nothing was
+              loaded (no files, or the load failed) or the averages couldn't be computed.
+    """
+    if not load_parquet_glob_to_duckdb(pattern, db_path=db_path, table_name=table_name):
+        return {}
+
+    try:
+        select_list = ", ".join(f'avg("{col}")' for col in average_columns)
+        row = _get_con(db_path).execute(f"SELECT {select_list} FROM {_read_parquet_source(pattern)};").fetchone()
+        return dict(zip(average_columns, row))
+    except Exception as e:
+        print(f"❌ Error computing averages in DuckDB (the rows were loaded): {e}")
+        return {}
+
 # Example of how to use this function (for testing the load script directly)
 if __name__ == "__main__":
     print("Running load_duckdb.py directly for testing...")
@@ -73,12 +279,13 @@ if __name__ == "__main__":
 
     # Optional: Verify the data was loaded by querying the test database
     try:
-        con_test = duckdb.connect(database=test_db_path, read_only=True)
+        # Reuse the cached connection: DuckDB refuses a second, read-only connection
+        # to a file this process already has open read-write
+        con_test = _get_con(test_db_path)
         print(f"\nVerifying data in {test_db_path}:")
         verified_df = con_test.execute("SELECT * FROM test_traffic_table").fetchdf()
         print("\nData successfully loaded and retrieved:")
         print(verified_df)
-        con_test.close()
         # Clean up the test database file
         # os.remove(test_db_path)
         # print(f"\nCleaned up test database file: {test_db_path}")
@@ -1,6 +1,8 @@
 # main.py
 import os
 import sys
+import asyncio
+import logging
 from dotenv import load_dotenv
 
 # Get the directory where the current script (main.py) is located
@@ -9,27 +11,21 @@ script_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(script_dir)
 
 # --- Configuration and Setup ---
-load_dotenv() # Load environment variables from .env file
-print("Configuration loaded from .env")
+load_dotenv() # Load environment variables from .env file (before CONFIG is built on import)
 
-# Add this line to check the raw environment variable value
-print(f"Raw TRAFFIC_OUTPUT_FOLDER env var: {os.getenv('TRAFFIC_OUTPUT_FOLDER')}")
-
-# This is where CONFIG['folder'] gets its value
-from extract_traffic import extract_traffic_data_for_areas, CONFIG
-
-# Add this line to check the value in CONFIG
-print(f"CONFIG['folder'] value: {CONFIG['folder']}")
 # Import the extraction function and the CONFIG dictionary from extracts.py
 # CONFIG is needed here for shared settings like API key, points, folder
 # These imports will now work because the script_dir has been added to sys.path
-from extract_traffic import extract_traffic_data_for_areas, CONFIG
+from extract_traffic import extract_traffic_data_for_areas_async, CONFIG
 
-# Import the transformation function from transform.py
-from traffic_transform import transform_traffic_data
+# Import the route summary (averages -> estimated travel time) from transform.py
+from traffic_transform import AVERAGE_COLUMNS, summarize_route
 
 # Import the loading function from load_duckdb.py
-from load_duckdb import load_transformed_data_to_duckdb
+from load_duckdb import load_parquet_with_averages_to_duckdb
+
+# Output folders already created by this process, so repeated runs skip the makedirs syscalls
+_ensured_dirs: set[str] = set()
 
 
 def main():
@@ -38,10 +34,6 @@ def main():
     """
     print("--- Starting TomTom Traffic Data ETL Pipeline ---")
 
-    # --- Configuration and Setup ---
-    load_dotenv() # Load environment variables from .env file
-    print("Configuration loaded from .env")
-
     # Perform initial checks using the imported CONFIG
     if not CONFIG.get("TOMTOM_API_KEY"): # Use .get for safer access
         raise ValueError("TOMTOM_API_KEY environment variable not set. Please check your .env file.")
@@ -51,7 +43,9 @@ def main():
     # Ensure the output folder is created relative to the script directory or the project root
     # Depending on your desired output location, you might need to adjust this.
     # For now, it uses the folder name defined in CONFIG, which is likely a relative path.
-    os.makedirs(output_folder, exist_ok=True)
+    if output_folder not in _ensured_dirs:
+        os.makedirs(output_folder, exist_ok=True)
+        _ensured_dirs.add(output_folder)
     print(f"Output folder '{output_folder}' ensured.")
 
     # Get the points to process from CONFIG
@@ -65,8 +59,9 @@ def main():
 
     # --- Extraction Phase ---
     print("\n--- Starting Extraction Phase ---")
-    # Call the extract function and get the list of saved file paths
-    extracted_file_paths = extract_traffic_data_for_areas(points_to_process)
+    # Fetch all points concurrently on one event loop and get the list of saved file paths
+    # (both the transform scan and the DuckDB load read them)
+    extracted_file_paths = asyncio.run(extract_traffic_data_for_areas_async(points_to_process))
 
     # Check if the extraction phase was successful and produced files
     if not extracted_file_paths:
@@ -79,33 +74,34 @@ def main():
     # print("Extracted files:", extracted_file_paths)
 
 
-    # --- Transformation Phase ---
-    print("\n--- Starting Transformation Phase ---")
-    # Pass the list of extracted file paths to the transformation function
-    transformed_data_df, calculated_averages_dict, estimated_time_sec = transform_traffic_data(extracted_file_paths)
-
-    # You can now use the results from the transformation phase in main.py
-    if transformed_data_df.empty:
-         print("\n❌ Transformation Phase resulted in no data. Check transformation logic and logs. Aborting loading.")
+    # --- Load Phase (with aggregation) ---
+    # Define the path for the DuckDB database file
+    # You might want to adjust this path if you want the DB outside the scripts folder
+    duckdb_database_path = os.path.join(script_dir, 'traffic_data.duckdb')
+    # DuckDB scans the extracted Parquet files itself and, once they're loaded, computes this
+    # run's column averages in SQL, so the rows never pass through pandas (or Python)
+    column_means = load_parquet_with_averages_to_duckdb(extracted_file_paths, AVERAGE_COLUMNS, db_path=duckdb_database_path)
+
+    # --- Route Summary ---
+    # No separate transformation runs: the averages come from the load above
+    print("\n--- Route Summary ---")
+    if not column_means:
+         # Empty when the load failed - don't report averages for unstored data
+         print("\n❌ Load Phase failed or loaded no data; nothing to summarize. Check the load logs.")
     else:
-         print("\n✅ Transformation Phase Complete.")
-         # Optionally print final results obtained from the transform step
-         print("\n--- Final Estimated Travel Time from Transformation ---")
+         # Name the averages with units and derive the route's estimated travel time
+         calculated_averages_dict, estimated_time_sec = summarize_route(column_means)
+         print("\n--- Final Estimated Travel Time ---")
          if estimated_time_sec is not None:
              print(f"Estimated Travel Time for Route: {estimated_time_sec:.2f} seconds ({estimated_time_sec/60:.2f} minutes)")
          else:
              print("Could not estimate travel time from sampled points.")
 
-         # --- Load Phase ---
-         # Define the path for the DuckDB database file
-         # You might want to adjust this path if you want the DB outside the scripts folder
-         duckdb_database_path = os.path.join(script_dir, 'traffic_data.duckdb')
-         # Call the load function with the transformed DataFrame and database path
-         load_transformed_data_to_duckdb(transformed_data_df, db_path=duckdb_database_path)
-
 
     print("\n--- ETL Pipeline Finished ---")
 
 
 if __name__ == "__main__":
+    # The extract modules report progress through `logging`; show INFO and above on stderr
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
     main()
\ No newline at end of file
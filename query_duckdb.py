@@ -1,3 +1,5 @@
+import atexit
+import functools
 import duckdb
 import pandas as pd
 import os
@@ -8,30 +10,64 @@ import os
 duckdb_database_path = 'traffic_data.duckdb' # Or the full path if it's elsewhere
 table_name = 'traffic_data'
 
-print(f"Attempting to connect to DuckDB database: {duckdb_database_path}")
-
-try:
-    # Connect to the DuckDB database
-    con = duckdb.connect(database=duckdb_database_path, read_only=True) # Open in read-only mode
-
-    print(f"Successfully connected. Querying table: {table_name}")
-
-    # Execute a SQL query to select all data from the table
-    query = f"SELECT * FROM {table_name};"
-    df = con.execute(query).fetchdf()
-
-    # Print the data as a pandas DataFrame
-    print("\nData from the DuckDB table:")
-    print(df)
-
-except duckdb.CatalogException as e:
-     print(f"❌ Error: Table '{table_name}' not found in the database.")
-     print("Please ensure the table name is correct and the ETL pipeline ran successfully.")
-     print(e)
-except Exception as e:
-    print(f"❌ An error occurred while accessing DuckDB: {e}")
-finally:
-    # Close the connection
-    if 'con' in locals() and con:
-        con.close()
-        print("\nDuckDB connection closed.")
\ No newline at end of file
+# Only the columns printed below are selected; the nested per-point coordinates list is left
+# out (coordinate_count and segment_length_km summarize it)
+query_columns = [
+    'frc', 'currentSpeed', 'freeFlowSpeed', 'currentTravelTime', 'freeFlowTravelTime',
+    'confidence', 'roadClosure', 'coordinate_count', 'segment_length_km', 'fetched_at',
+]
+rows_per_batch = 100_000 # Rows fetched from DuckDB at a time
+
+
+@functools.lru_cache(maxsize=1)
+def _get_con(db_path):
+    """
+    Returns a read-only connection to db_path, opened on first use and reused by later
+    queries in this process (skipping the connection open and catalog load each time).
+    It is closed at interpreter exit.
+    """
+    print(f"Attempting to connect to DuckDB database: {db_path}")
+    con = duckdb.connect(database=db_path, read_only=True) # Open in read-only mode
+    atexit.register(con.close)
+    return con
+
+
+def main():
+    try:
+        # Connect to the DuckDB database (cached; not closed here so later queries reuse it)
+        con = _get_con(duckdb_database_path)
+
+        print(f"Successfully connected. Querying table: {table_name}")
+
+        # Execute a SQL query to select the printed columns from the table. Only those the table
+        # actually has are selected, so databases written with an older schema can still be read.
+        # DESCRIBE also raises CatalogException if the table is missing.
+        table_columns = {row[0] for row in con.execute(f"DESCRIBE {table_name}").fetchall()}
+        selected = [col for col in query_columns if col in table_columns]
+        if not selected:
+            print(f"❌ Table '{table_name}' has none of the expected columns: {query_columns}")
+            return
+        query = f"SELECT {', '.join(selected)} FROM {table_name};"
+
+        # Stream the result as Arrow record batches instead of materializing it all with fetchdf();
+        # each batch is converted to an Arrow-backed pandas DataFrame only for printing
+        # Newer DuckDB names this to_arrow_reader() and deprecates fetch_record_batch(); older
+        # releases in the supported range only have the latter
+        result = con.execute(query)
+        to_arrow_reader = getattr(result, "to_arrow_reader", None) or result.fetch_record_batch
+        reader = to_arrow_reader(rows_per_batch)
+
+        print("\nData from the DuckDB table:")
+        for batch in reader:
+            print(batch.to_pandas(types_mapper=pd.ArrowDtype))
+
+    except duckdb.CatalogException as e:
+         print(f"❌ Error: Table '{table_name}' not found in the database.")
+         print("Please ensure the table name is correct and the ETL pipeline ran successfully.")
+         print(e)
+    except Exception as e:
+        print(f"❌ An error occurred while accessing DuckDB: {e}")
+
+
+if __name__ == "__main__":
+    main()
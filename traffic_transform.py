@@ -1,109 +1,240 @@
 # transform.py
 
+import numpy as np
 import pandas as pd
-import os # Might be needed for path manipulation later, but not strictly by transform_traffic_data itself
-import glob # Useful if you want to find files based on patterns later
-import traceback
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import os # Used by the __main__ test block to list extraction files
+import re
+import fnmatch
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from math import isfinite
 
-def transform_traffic_data(file_paths):
+from _avg_kernel import col_sums_counts
+
+logger = logging.getLogger(__name__)
+
+# km/h -> m/s: km/h * (1000 m / 1 km) * (1 hour / 3600 seconds)
+_MPS_PER_KMPH = 1000.0 / 3600.0
+
+# Unit suffix added to each average's key name for clarity (travel times are per the API's segment)
+# Column units from API: currentSpeed, freeFlowSpeed (km/h); currentTravelTime, freeFlowTravelTime (seconds per segment)
+_UNIT_SUFFIX = {
+    'currentSpeed': 'kmph',
+    'freeFlowSpeed': 'kmph',
+    'currentTravelTime': 'seconds_per_segment',
+    'freeFlowTravelTime': 'seconds_per_segment',
+    'confidence': 'unitless',
+}
+# Numeric columns averaged across the sampled points
+AVERAGE_COLUMNS = ['currentSpeed', 'freeFlowSpeed', 'currentTravelTime', 'freeFlowTravelTime', 'confidence']
+
+# --- Derive Estimated Travel Time for the Full Route ---
+# This REQUIRES the total distance of the route from start (d3) to end (d2).
+# This distance is NOT provided by the flowSegmentData API.
+# You must replace this placeholder with the actual distance (e.g., obtained from a mapping service).
+ROUTE_DISTANCE_METERS = 5000 # <<< REPLACE WITH ACTUAL ROUTE DISTANCE IN METERS (e.g., 5000 for 5km)
+
+
+def _safe_read_metadata(f_path):
     """
-    Reads data from saved Parquet files, combines it, and calculates averages.
-    Derives estimated travel time based on average speed and a *known* route distance.
+    Reads the Parquet footer of one file.
+    Returns (path, Arrow schema) if readable, else None (the failure is logged as a warning).
+    """
+    try:
+        return f_path, pq.read_metadata(f_path).schema.to_arrow_schema()
+    except (OSError, pa.ArrowInvalid) as e: # Missing/unreadable file or corrupt footer; anything else propagates
+        logger.warning("Skipping unreadable file %s: %s", f_path, e)
+        return None # Skip this file and continue with others
 
-    Args:
-        file_paths (list): A list of paths (strings) to the Parquet files from a single extraction run
-                           (each file containing data for one point). These should be full paths.
 
-    Returns:
-        pd.DataFrame: A DataFrame containing the combined raw data.
-        dict: A dictionary containing calculated average metrics with units in keys.
-        float/None: Estimated travel time in seconds, or None if calculation is not possible.
+def _unify_file_schemas(readable, columns=None):
     """
-    print("\n--- Starting Transformation ---")
+    Builds one scan schema from the files' footer schemas, skipping files that can't share it.
 
-    if not file_paths:
-        print("No files provided for transformation.")
-        # Returning empty dataframe, empty dict, and None estimated time
-        return pd.DataFrame(), {}, None
+    Schemas are merged with permissive promotion (like pa.concat_tables(promote_options="permissive")):
+    a column missing from some files is read as nulls there, and compatible types widen
+    (e.g. int64 and float speeds from older extractions become double). A file whose schema
+    can't be merged at all (e.g. coordinates stored as nested lists rather than {lat, lon}
+    structs) is skipped with a warning instead of failing the whole transform. Files with
+    more columns are merged first, so the current extraction format wins over older ones.
 
-    all_dataframes = []
-    for f_path in file_paths:
-        try:
-            print(f"📖 Reading file: {f_path}")
-            df = pd.read_parquet(f_path)
-            all_dataframes.append(df)
-        except Exception as e:
-            print(f"❌ Error reading file {f_path}: {e}")
-            traceback.print_exc()
-            continue # Skip this file and continue with others
+    Args:
+        readable (list): (path, Arrow schema) pairs, in input order.
+        columns (list/None): If given, only these columns are unified (and will be scanned), so a
+                             file is only skipped over a conflict in a column that is actually read.
 
-    if not all_dataframes:
-         print("No dataframes successfully read.")
-         # Returning empty dataframe, empty dict, and None estimated time
-         return pd.DataFrame(), {}, None
+    Returns:
+        pa.Schema: The unified scan schema.
+        list: Paths of the files included in it, in input order.
+    """
+    if columns is not None:
+        readable = [
+            (f_path, pa.schema([schema.field(col) for col in columns if schema.get_field_index(col) != -1]))
+            for f_path, schema in readable
+        ]
+    scan_schema = None
+    included = set()
+    for f_path, schema in sorted(readable, key=lambda item: len(item[1]), reverse=True):
+        try:
+            scan_schema = schema if scan_schema is None else pa.unify_schemas(
+                [scan_schema, schema], promote_options="permissive"
+            )
+            included.add(f_path)
+        except (pa.ArrowTypeError, pa.ArrowInvalid) as e:
+            logger.warning("Skipping file with an incompatible schema %s: %s", f_path, e)
+    return scan_schema, [f_path for f_path, _ in readable if f_path in included]
 
 
-    # Combine all dataframes into one
-    combined_df = pd.concat(all_dataframes, ignore_index=True)
-    print(f"Combined data from {len(all_dataframes)} files into DataFrame with shape {combined_df.shape}")
+def summarize_route(column_means, route_distance_meters=ROUTE_DISTANCE_METERS):
+    """
+    Names the per-column averages with their units, prints them, and derives the estimated
+    travel time for the route from the average current speed and a *known* route distance.
+    Shared by transform_traffic_data and by callers whose averages come from elsewhere
+    (e.g. computed by DuckDB during the load).
 
-    # --- Calculate Averages ---
-    # Column units from API: currentSpeed, freeFlowSpeed (km/h); currentTravelTime, freeFlowTravelTime (seconds per segment)
-    numeric_cols_for_avg = ['currentSpeed', 'freeFlowSpeed', 'currentTravelTime', 'freeFlowTravelTime', 'confidence']
-    averages = {}
-    for col in numeric_cols_for_avg:
-        if col in combined_df.columns:
-             # Add unit to the key name for clarity
-             if col in ['currentSpeed', 'freeFlowSpeed']:
-                 avg_key = f"average_{col}_kmph"
-             elif col in ['currentTravelTime', 'freeFlowTravelTime']:
-                 avg_key = f"average_{col}_seconds_per_segment" # Clarify this is per the API's segment
-             elif col == 'confidence':
-                 avg_key = f"average_{col}_unitless"
-             else:
-                 avg_key = f"average_{col}" # Default if unit unknown/unnecessary
-
-             averages[avg_key] = combined_df[col].mean() # .mean() ignores NaN values
-
-        # Add None/NaN for columns expected but not found/parsed
-        elif f"average_{col}" not in averages: # Prevent overwriting if a unit-specific key was used
-             averages[f"average_{col}"] = None # Or pd.NA
+    Args:
+        column_means (dict): Column name -> average (float or None) for the AVERAGE_COLUMNS.
+        route_distance_meters (float): Route length in meters. Defaults to ROUTE_DISTANCE_METERS.
 
+    Returns:
+        dict: Calculated average metrics with units in keys (None for missing columns).
+        float/None: Estimated travel time in seconds, or None if calculation is not possible.
+    """
+    averages = {
+        f"average_{col}_{_UNIT_SUFFIX.get(col, 'unitless')}": column_means.get(col)
+        for col in AVERAGE_COLUMNS
+    }
 
     print("\nCalculated Averages from Sampled Points:")
     for key, value in averages.items():
         print(f"  {key}: {value}")
 
     # --- Derive Estimated Travel Time for the Full Route ---
-    # This REQUIRES the total distance of the route from start (d3) to end (d2).
-    # This distance is NOT provided by the flowSegmentData API.
-    # You must replace this placeholder with the actual distance (e.g., obtained from a mapping service).
-    route_distance_meters = 5000 # <<< REPLACE WITH ACTUAL ROUTE DISTANCE IN METERS (e.g., 5000 for 5km)
-    # Define the route distance outside the function or pass it as an argument if it varies
-
     # Get the average current speed across the sampled points
     # Use .get() with a default to avoid KeyError if the key doesn't exist due to parsing issues
     avg_current_speed_kmph = averages.get("average_currentSpeed_kmph") # Unit: km/h
 
     estimated_travel_time_seconds = None
-    # Check if average speed is a valid number and non-negative
-    if isinstance(avg_current_speed_kmph, (int, float)) and avg_current_speed_kmph >= 0 and route_distance_meters is not None and route_distance_meters > 0:
-         # Convert average speed from km/h to meters per second (m/s)
-         # Formula: km/h * (1000 m / 1 km) * (1 hour / 3600 seconds) = m/s
-         avg_current_speed_mps = avg_current_speed_kmph * 1000 / 3600 # Unit: m/s
-
-         if avg_current_speed_mps > 0: # Avoid division by zero
-            # Time (seconds) = Distance (m) / Speed (m/s)
-            estimated_travel_time_seconds = route_distance_meters / avg_current_speed_mps # Unit: seconds
-            print(f"\nEstimated travel time for route (assuming distance {route_distance_meters:.2f} meters):")
-            print(f"  Average Current Speed Used: {avg_current_speed_kmph:.2f} km/h")
-            print(f"  Estimated Time: {estimated_travel_time_seconds:.2f} seconds")
-            print(f"  Estimated Time: {estimated_travel_time_seconds/60:.2f} minutes")
-         else:
-             print("\nCannot estimate travel time: Average current speed is effectively zero (indicates significant delay).")
+    # averages values are Python floats or None; `or 0.0` folds None into the not-positive case,
+    # and a finite, positive speed also avoids division by zero (NaN/inf fail isfinite)
+    avg_speed = avg_current_speed_kmph or 0.0
+    if isfinite(avg_speed) and avg_speed > 0 and route_distance_meters:
+        # Time (seconds) = Distance (m) / Speed (m/s)
+        estimated_travel_time_seconds = route_distance_meters / (avg_speed * _MPS_PER_KMPH) # Unit: seconds
+        print(f"\nEstimated travel time for route (assuming distance {route_distance_meters:.2f} meters):")
+        print(f"  Average Current Speed Used: {avg_current_speed_kmph:.2f} km/h")
+        print(f"  Estimated Time: {estimated_travel_time_seconds:.2f} seconds")
+        print(f"  Estimated Time: {estimated_travel_time_seconds/60:.2f} minutes")
+    elif avg_current_speed_kmph == 0 and route_distance_meters: # A real zero, not a missing (None) average
+        print("\nCannot estimate travel time: Average current speed is effectively zero (indicates significant delay).")
     else:
         print("\nCannot estimate travel time: Average current speed is missing/invalid, or route distance is missing/zero.")
 
+    return averages, estimated_travel_time_seconds
+
+
+def transform_traffic_data(file_paths, return_dataframe=True):
+    """
+    Reads data from saved Parquet files, combines it, and calculates averages.
+    Derives estimated travel time based on average speed and a *known* route distance.
+
+    Kept for standalone use (this module's __main__, or inspecting extraction files without a
+    database): the main.py pipeline gets its averages from DuckDB during the load instead
+    (load_duckdb.load_parquet_with_averages_to_duckdb) and only shares summarize_route.
+
+    All readable files are read in a single pyarrow.dataset scan, consumed record batch by
+    record batch: averages are kept as running sums/counts, so unless the combined DataFrame
+    is requested no rows are held after their batch has been processed.
+
+    Args:
+        file_paths (iterable): Paths (strings) to the Parquet files from a single extraction run
+                               (one file per extraction batch). These should be full paths.
+        return_dataframe (bool): Whether to build the combined DataFrame. Pass False when only the
+                                 averages and estimated time are needed, to skip the Arrow -> pandas conversion.
+
+    Returns:
+        pd.DataFrame/None: A DataFrame containing the combined raw data, or None if return_dataframe is False.
+        dict: A dictionary containing calculated average metrics with units in keys.
+        float/None: Estimated travel time in seconds, or None if calculation is not possible.
+    """
+    print("\n--- Starting Transformation ---")
+
+    file_paths = list(file_paths) # Sized and reusable, whatever iterable was passed
+    if not file_paths:
+        print("No files provided for transformation.")
+        # Returning empty dataframe (or None), empty dict, and None estimated time
+        return (pd.DataFrame() if return_dataframe else None), {}, None
+
+    # Pre-filter on the Parquet footer so one unreadable file doesn't fail the whole scan.
+    # Footer reads are I/O-bound and release the GIL, so they're checked concurrently;
+    # ex.map keeps the input order. Progress is printed here, before dispatch, so worker
+    # threads don't interleave their output.
+    for f_path in file_paths:
+        print(f"📖 Checking file: {f_path}")
+    with ThreadPoolExecutor(max_workers=min(32, len(file_paths))) as ex:
+        readable = [result for result in ex.map(_safe_read_metadata, file_paths) if result is not None]
+    readable_paths = [f_path for f_path, _ in readable]
+
+    if not readable_paths:
+         print("No files successfully read.")
+         # Returning empty dataframe (or None), empty dict, and None estimated time
+         return (pd.DataFrame() if return_dataframe else None), {}, None
+
+
+    # Read all files in one batched scan. The scan schema is unified from every file's footer,
+    # so files written before a column was added or a type changed are read with nulls/casts
+    # instead of the first file's schema deciding; files that can't be unified are skipped.
+    # Without the DataFrame only the averaged columns are read, so only those need to unify.
+    scan_schema, readable_paths = _unify_file_schemas(readable, None if return_dataframe else AVERAGE_COLUMNS)
+    skipped = len(readable) - len(readable_paths)
+    if skipped:
+        print(f"⚠️ Skipped {skipped} of {len(readable)} files with an incompatible schema (see warnings above); "
+              f"the combined data and averages cover only the remaining {len(readable_paths)} files.")
+    dataset = ds.dataset(readable_paths, schema=scan_schema, format="parquet")
+
+    # --- Calculate Averages ---
+    # schema.names builds a new list on every access; take it once as a set
+    available = set(scan_schema.names)
+    present = [col for col in AVERAGE_COLUMNS if col in available]
+
+    # Without the DataFrame only the averaged columns need to be decoded
+    scan_columns = None if return_dataframe else present
+    batches = [] # Only kept when the combined DataFrame is returned
+    sums = np.zeros(len(present))
+    counts = np.zeros(len(present), dtype=np.int64)
+    row_count = 0
+    for batch in dataset.to_batches(columns=scan_columns):
+        # Stack the present columns as float64 (nulls -> NaN), one row per column, and add their
+        # sums/counts from one compiled Numba kernel; no pandas conversion is needed for them
+        columns = np.empty((len(present), batch.num_rows))
+        for j, col in enumerate(present):
+            columns[j] = pc.fill_null(pc.cast(batch.column(col), pa.float64()), np.nan).to_numpy(zero_copy_only=False)
+        batch_sums, batch_counts = col_sums_counts(columns)
+        sums += batch_sums
+        counts += batch_counts
+        row_count += batch.num_rows
+        if return_dataframe:
+            batches.append(batch)
+    print(f"Scanned {row_count} rows from {len(readable_paths)} files")
+
+    # Columns not found/parsed, or with no values, are left out (summarize_route reports them as None)
+    means = {col: float(sums[j] / counts[j]) for j, col in enumerate(present) if counts[j]}
+
+    averages, estimated_travel_time_seconds = summarize_route(means)
+
+    # Only the returned combined data needs pandas, so skip the conversion when it isn't wanted.
+    # The kept batches become one table without copying; self_destruct frees Arrow buffers as
+    # columns are converted, and ArrowDtype keeps the columns Arrow-backed (no numpy copy)
+    combined_df = None
+    if return_dataframe:
+        table = pa.Table.from_batches(batches, schema=scan_schema)
+        del batches
+        combined_df = table.to_pandas(self_destruct=True, types_mapper=pd.ArrowDtype)
+        del table # Must not be used after self_destruct
 
     print("\n--- Transformation Complete ---")
 
@@ -118,17 +249,24 @@ def transform_traffic_data(file_paths):
 if __name__ == "__main__":
     print("Running transform.py directly for testing...")
     # This requires you to manually specify paths to files you want to transform.
-    # For example, if you have files in 'traffic_data' like:
-    # traffic_data_10_79_106_68_20231027_100000.parquet
-    # traffic_data_10_78_106_70_20231027_100005.parquet
-    # traffic_data_10_79_106_71_20231027_100010.parquet
+    # Extraction writes one file per batch, partitioned by run date, e.g.:
+    # traffic_data/run_date=2023-10-27/traffic_data_route_20231027_100000.parquet
+    # traffic_data/run_date=2023-10-27/traffic_data_route_20231027_110000.parquet
     # You would list them here:
-    example_file_paths = glob.glob('traffic_data/traffic_data_10_79_106_68_*.parquet') # Example: find all for one point
+    # Example: find all route batches. os.scandir yields names (and entry types) straight from
+    # the directory listing, matched against patterns compiled once, instead of glob.glob
+    partition_pat = re.compile(fnmatch.translate('run_date=*'))
+    file_pat = re.compile(fnmatch.translate('traffic_data_route_*.parquet'))
+    example_file_paths = []
+    if os.path.isdir('traffic_data'):
+        for partition in os.scandir('traffic_data'):
+            if partition.is_dir() and partition_pat.match(partition.name):
+                example_file_paths.extend(
+                    entry.path for entry in os.scandir(partition.path) if file_pat.match(entry.name)
+                )
     # Or specify exact files from a specific run:
     # example_file_paths = [
-    #     'traffic_data/traffic_data_10_79_106_68_20231027_100000.parquet',
-    #     'traffic_data/traffic_data_10_78_106_70_20231027_100005.parquet',
-    #     'traffic_data/traffic_data_10_79_106_71_20231027_100010.parquet'
+    #     'traffic_data/run_date=2023-10-27/traffic_data_route_20231027_100000.parquet',
     # ]
 
     if example_file_paths: